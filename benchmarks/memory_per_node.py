@@ -0,0 +1,48 @@
+"""Measure the memory used per node by a tree of `Node`s and its structural index.
+
+Run from the repository's root directory with `PYTHONPATH=src python benchmarks/memory_per_node.py`.
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from node import LeafNode, Node
+
+
+def make_tree(n_leaves: int, branching: int) -> Node:
+    """Return a complete tree with the given number of leaves, built bottom-up one level at a time."""
+    level: list[Node] = [LeafNode(limit=1.0) for _ in range(n_leaves)]
+    while len(level) > 1:
+        level = [
+            Node(limit=float(branching), children=level[i : i + branching])
+            for i in range(0, len(level), branching)
+        ]
+    return level[0]
+
+
+def measure(n_leaves: int, branching: int) -> tuple[int, float]:
+    """Return the number of nodes in the tree and the bytes allocated per node by building it and
+    its structural index.
+    """
+    gc.collect()
+    tracemalloc.start()
+    tree = make_tree(n_leaves, branching)
+    n_nodes = len(tree.all_nodes)  # Builds the structural index.
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n_nodes, allocated / n_nodes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leaves", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--branching", type=int, default=4)
+    args = parser.parse_args()
+    for n_leaves in args.leaves:
+        n_nodes, bytes_per_node = measure(n_leaves, args.branching)
+        print(f"{n_nodes:>10} nodes: {bytes_per_node:8.1f} bytes per node")
+
+
+if __name__ == "__main__":
+    main()
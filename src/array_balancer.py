@@ -0,0 +1,165 @@
+import numpy as np
+
+from array_tree import ArrayTree
+from constrained_node_allocation_balancer import AncestorChainWithoutLimitError
+
+
+def array_balancer(tree: ArrayTree) -> None:
+    """Balance the allocations of an `ArrayTree` in place, like `constrained_node_allocation_balancer`
+    with `solver="water_filling"`, using vectorized operations over each level of the tree.
+    """
+    if np.any(tree.allocation != 0.0):
+        raise ValueError("All node allocations must start at 0.0.")
+    _set_root_allocation(tree, tree.limit, tree.allocation)
+    _adjust_inactive_limits(tree, tree.limit)
+    _balance_allocations(tree, tree.limit, tree.allocation)
+
+
+def array_balancer_sweep(tree: ArrayTree, limits: np.ndarray) -> np.ndarray:
+    """Balance the tree once for each scenario of limits, returning the leaves' allocations.
+
+    `limits` has one row per scenario and one column per node of `tree`, in the tree's order. The
+    returned array has one row per scenario and one column per leaf, in the tree's order (that is,
+    for the nodes at `np.flatnonzero(tree.is_leaf)`). The tree's own limits and allocations are not
+    used or changed.
+
+    All scenarios are balanced at once, by the same vectorized operations as `array_balancer`
+    applied along an additional axis, sharing the tree's structure.
+    """
+    limits = np.array(limits, dtype=np.float64)
+    if limits.ndim != 2 or limits.shape[1] != tree.n_nodes:
+        raise ValueError("`limits` must have one column per node of the tree.")
+    allocations = np.zeros_like(limits)
+    _set_root_allocation(tree, limits, allocations)
+    _adjust_inactive_limits(tree, limits)
+    _balance_allocations(tree, limits, allocations)
+    return allocations[:, tree.is_leaf]
+
+
+# The following functions take `limit` and `allocation` arrays with one element per node of `tree`
+#     along their last axis, and any number of leading axes (such as one for scenarios).
+
+
+def _set_root_allocation(
+    tree: ArrayTree, limit: np.ndarray, allocation: np.ndarray
+) -> None:
+    # Propagate the minimum limit along each path from the root to check that every leaf is
+    #     constrained by its own limit or that of one of its ancestors:
+    path_limit = limit.copy()
+    for level in range(1, tree.n_levels):
+        nodes = tree.level_slice(level)
+        path_limit[..., nodes] = np.minimum(
+            path_limit[..., nodes], path_limit[..., tree.parent[nodes]]
+        )
+    if np.any(np.isinf(path_limit[..., tree.is_leaf])):
+        raise AncestorChainWithoutLimitError
+    # The largest possible allocation to each node is its limit or the sum of the largest possible
+    #     allocations to its children, whichever is smaller:
+    max_allocation = limit.copy()
+    for level in reversed(range(tree.n_levels - 1)):
+        parents = tree.parents_with_children(level)
+        max_allocation[..., parents] = np.minimum(
+            max_allocation[..., parents], tree.sum_children(max_allocation, level)
+        )
+    allocation[..., 0] = max_allocation[..., 0]
+
+
+def _adjust_inactive_limits(tree: ArrayTree, limit: np.ndarray) -> None:
+    for level in reversed(range(1, tree.n_levels - 1)):  # Root excluded.
+        parents = tree.parents_with_children(level)
+        children_throughput = tree.sum_children(limit, level)
+        inactive = np.isinf(limit[..., parents]) | (
+            children_throughput <= limit[..., parents]
+        )
+        limit[..., parents] = np.where(
+            inactive, children_throughput, limit[..., parents]
+        )
+
+
+def _balance_allocations(
+    tree: ArrayTree, limit: np.ndarray, allocation: np.ndarray
+) -> None:
+    for level in range(tree.n_levels - 1):
+        parents = tree.parents_with_children(level)
+        children = tree.level_slice(level + 1)
+        allocation[..., children] = _water_fill_segments(
+            totals=allocation[..., parents],
+            totals_weights=tree.n_leaves_at_or_below[parents],
+            totals_offsets=tree.sum_of_shift_constants_at_or_below[parents],
+            segment_starts=tree.first_child[parents] - children.start,
+            limits=limit[..., children] / tree.conversion_factor[children],
+            weights=tree.n_leaves_at_or_below[children],
+            offsets=tree.sum_of_shift_constants_at_or_below[children],
+        )
+
+
+def _water_fill_segments(
+    totals: np.ndarray,
+    totals_weights: np.ndarray,
+    totals_offsets: np.ndarray,
+    segment_starts: np.ndarray,
+    limits: np.ndarray,
+    weights: np.ndarray,
+    offsets: np.ndarray,
+) -> np.ndarray:
+    """Apply `water_fill` to every segment of contiguous recipients at once.
+
+    `totals`, and the sums of the weights and offsets of each segment, are given per segment, and
+    `limits`, `weights` and `offsets` are given per recipient. `totals` and `limits` may have any
+    number of leading axes, along which the segments are filled independently.
+    """
+    n = limits.shape[-1]
+    segment_lengths = np.diff(np.append(segment_starts, n))
+    segment = np.repeat(np.arange(len(segment_starts)), segment_lengths)
+    weights = np.broadcast_to(weights, limits.shape)
+    offsets = np.broadcast_to(offsets, limits.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        thresholds = np.where(np.isinf(limits), np.inf, (limits - offsets) / weights)
+
+        # Sort the recipients of each segment by the level at which they reach their limits:
+        order = np.lexsort(
+            (thresholds, np.broadcast_to(segment, limits.shape)), axis=-1
+        )
+        sorted_limits = np.take_along_axis(limits, order, axis=-1)
+        sorted_weights = np.take_along_axis(weights, order, axis=-1)
+        sorted_offsets = np.take_along_axis(offsets, order, axis=-1)
+        sorted_thresholds = np.take_along_axis(thresholds, order, axis=-1)
+
+        # For the j-th recipient of each segment in sorted order, sums over the recipients before
+        #     it within the segment, which are capped if the level exceeds its threshold:
+        capped_totals = _exclusive_segment_cumsum(
+            np.where(np.isinf(sorted_limits), 0.0, sorted_limits),
+            segment_starts,
+            segment,
+        )
+        remaining_weights = totals_weights[segment] - _exclusive_segment_cumsum(
+            sorted_weights, segment_starts, segment
+        )
+        remaining_offsets = totals_offsets[segment] - _exclusive_segment_cumsum(
+            sorted_offsets, segment_starts, segment
+        )
+        candidate_levels = (
+            totals[..., segment] - capped_totals - remaining_offsets
+        ) / remaining_weights
+
+        # The level of each segment is the candidate level of the first recipient (in sorted order)
+        #     whose threshold is not below it:
+        positions = np.where(candidate_levels <= sorted_thresholds, np.arange(n), n)
+        first_positions = np.minimum.reduceat(positions, segment_starts, axis=-1)
+        levels = np.where(
+            first_positions < n,
+            np.take_along_axis(
+                candidate_levels, np.minimum(first_positions, n - 1), axis=-1
+            ),
+            np.inf,
+        )
+
+        return np.minimum(limits, levels[..., segment] * weights + offsets)
+
+
+def _exclusive_segment_cumsum(
+    values: np.ndarray, segment_starts: np.ndarray, segment: np.ndarray
+) -> np.ndarray:
+    """Return the sum of the values before each value within its segment, along the last axis."""
+    cumsum = np.cumsum(values, axis=-1) - values
+    return cumsum - cumsum[..., segment_starts][..., segment]
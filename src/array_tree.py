@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import dataclasses
+
+import numpy as np
+
+from node import LeafNode, Node
+
+
+@dataclasses.dataclass
+class ArrayTree:
+    """A tree stored as parallel NumPy arrays, one element per node.
+
+    Nodes are stored in level order: the root first, then the root's children, then their children,
+    and so on, with the nodes of each level in depth-first order. As a result, every node comes
+    after its parent, the nodes of each level are contiguous, and the children of each node are
+    contiguous and in the same order as their parents.
+
+    Non-leaf nodes have a `conversion_factor` of 1.0 and a `shift_constant` of 0.0.
+    """
+
+    parent: np.ndarray
+    """The index of each node's parent, or -1 for the root node."""
+    limit: np.ndarray
+    allocation: np.ndarray
+    conversion_factor: np.ndarray
+    shift_constant: np.ndarray
+    is_leaf_node: np.ndarray
+    """Whether each node is a `LeafNode` (rather than a `Node`), for lossless conversion."""
+
+    level: np.ndarray = dataclasses.field(init=False, repr=False)
+    level_starts: np.ndarray = dataclasses.field(init=False, repr=False)
+    """The index of the first node of each level, followed by the number of nodes."""
+    n_children: np.ndarray = dataclasses.field(init=False, repr=False)
+    first_child: np.ndarray = dataclasses.field(init=False, repr=False)
+    n_leaves_at_or_below: np.ndarray = dataclasses.field(init=False, repr=False)
+    sum_of_shift_constants_at_or_below: np.ndarray = dataclasses.field(
+        init=False, repr=False
+    )
+
+    def __post_init__(self) -> None:
+        self.parent = np.asarray(self.parent, dtype=np.int64)
+        self.limit = np.asarray(self.limit, dtype=np.float64)
+        self.allocation = np.asarray(self.allocation, dtype=np.float64)
+        self.conversion_factor = np.asarray(self.conversion_factor, dtype=np.float64)
+        self.shift_constant = np.asarray(self.shift_constant, dtype=np.float64)
+        self.is_leaf_node = np.asarray(self.is_leaf_node, dtype=np.bool_)
+
+        n_nodes = len(self.parent)
+        if n_nodes == 0 or self.parent[0] != -1:
+            raise ValueError("The first node must be the root node.")
+        if np.any(self.parent[1:] < 0) or np.any(np.diff(self.parent[1:]) < 0):
+            raise ValueError("Nodes must be in level order.")
+        if np.any(self.parent[1:] >= np.arange(1, n_nodes)):
+            raise ValueError("Every node must come after its parent.")
+
+        self.n_children = np.bincount(self.parent[1:], minlength=n_nodes)
+        self.first_child = np.cumsum(self.n_children) - self.n_children + 1
+
+        # Each level consists of the children of the nodes of the previous level:
+        level_starts = [0, 1]
+        while level_starts[-1] < n_nodes:
+            start, end = level_starts[-2], level_starts[-1]
+            level_starts.append(end + int(self.n_children[start:end].sum()))
+        self.level_starts = np.array(level_starts)
+        self.level = np.repeat(np.arange(self.n_levels), np.diff(self.level_starts))
+
+        self.n_leaves_at_or_below = np.where(self.is_leaf, self.conversion_factor, 0.0)
+        self.sum_of_shift_constants_at_or_below = np.where(
+            self.is_leaf, self.shift_constant, 0.0
+        )
+        for level in reversed(range(self.n_levels - 1)):
+            parents = self.parents_with_children(level)
+            self.n_leaves_at_or_below[parents] = self.sum_children(
+                self.n_leaves_at_or_below, level
+            )
+            self.sum_of_shift_constants_at_or_below[parents] = self.sum_children(
+                self.sum_of_shift_constants_at_or_below, level
+            )
+
+    def __reduce__(self) -> tuple:
+        # Pickle only the arrays that the others are derived from:
+        return (
+            type(self),
+            (
+                self.parent,
+                self.limit,
+                self.allocation,
+                self.conversion_factor,
+                self.shift_constant,
+                self.is_leaf_node,
+            ),
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.parent)
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.level_starts) - 1
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.n_children == 0
+
+    def level_slice(self, level: int) -> slice:
+        return slice(self.level_starts[level], self.level_starts[level + 1])
+
+    def parents_with_children(self, level: int) -> np.ndarray:
+        """Return the indices of the nodes of the given level that have children."""
+        start = self.level_starts[level]
+        return start + np.flatnonzero(self.n_children[self.level_slice(level)])
+
+    def sum_children(self, values: np.ndarray, level: int) -> np.ndarray:
+        """Sum `values` over the children of each node returned by `parents_with_children(level)`."""
+        children = self.level_slice(level + 1)
+        segment_starts = (
+            self.first_child[self.parents_with_children(level)] - children.start
+        )
+        return np.add.reduceat(values[..., children], segment_starts, axis=-1)
+
+    # ==============================================================================================
+    # Methods for converting to and from `Node`s:
+
+    @classmethod
+    def from_node(cls, tree: Node) -> ArrayTree:
+        index = tree.index
+        nodes = [
+            node
+            for level_nodes in index.nodes_by_level.values()
+            for node in level_nodes
+        ]
+        array_indices = np.empty(len(nodes), dtype=np.int64)
+        array_indices[[node._position for node in nodes]] = np.arange(len(nodes))
+        return cls(
+            parent=[
+                -1 if node.parent is None else array_indices[node.parent._position]
+                for node in nodes
+            ],
+            limit=[node.limit for node in nodes],
+            allocation=[node.allocation for node in nodes],
+            conversion_factor=[
+                getattr(node, "conversion_factor", 1.0) for node in nodes
+            ],
+            shift_constant=[getattr(node, "shift_constant", 0.0) for node in nodes],
+            is_leaf_node=[isinstance(node, LeafNode) for node in nodes],
+        )
+
+    def write_to(self, tree: Node) -> None:
+        """Copy the limits and allocations into the equivalent tree of `Node`s, such as the tree that
+        this was converted from.
+        """
+        nodes = [
+            node
+            for level_nodes in tree.index.nodes_by_level.values()
+            for node in level_nodes
+        ]
+        if len(nodes) != self.n_nodes:
+            raise ValueError("The tree has a different number of nodes.")
+        for node, limit, allocation in zip(
+            nodes, self.limit.tolist(), self.allocation.tolist(), strict=True
+        ):
+            node.limit = limit
+            node.allocation = allocation
+
+    def to_node(self) -> Node:
+        """Return an equivalent tree of `Node`s and `LeafNode`s."""
+        children: list[list[Node]] = [[] for _ in range(self.n_nodes)]
+        # Create nodes in reverse level order, such that each node's children exist before it:
+        for i in reversed(range(self.n_nodes)):
+            if self.is_leaf_node[i]:
+                node = LeafNode(
+                    limit=float(self.limit[i]),
+                    allocation=float(self.allocation[i]),
+                    conversion_factor=float(self.conversion_factor[i]),
+                    shift_constant=float(self.shift_constant[i]),
+                )
+            else:
+                node = Node(
+                    limit=float(self.limit[i]),
+                    allocation=float(self.allocation[i]),
+                    children=children[i][::-1],
+                )
+            if i > 0:
+                children[self.parent[i]].append(node)
+        return node
@@ -0,0 +1,67 @@
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from array_balancer import array_balancer
+from array_tree import ArrayTree
+from node import Node
+
+
+def balance_many(
+    trees: Iterable[Node | ArrayTree],
+    max_workers: int | None = None,
+    chunksize: int = 16,
+) -> Iterator[Node | ArrayTree]:
+    """Balance many independent trees in parallel across a pool of processes, yielding each tree once
+    balanced, in the order given.
+
+    Trees are balanced as by `array_balancer`. Each tree is sent to a worker process as an
+    `ArrayTree`, in chunks of `chunksize` trees, and only the balanced limits and allocations are
+    sent back and written to the tree given (whether a `Node` or an `ArrayTree`). Trees are read
+    from `trees` only as fast as the workers keep up, so that `trees` can be a lazy iterable of
+    more trees than fit in memory at once.
+    """
+    n_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending: deque[tuple[tuple[Node | ArrayTree, ...], list[ArrayTree], Future]] = (
+            deque()
+        )
+        trees = iter(trees)
+        while chunk := tuple(islice(trees, chunksize)):
+            array_trees = [
+                ArrayTree.from_node(tree) if isinstance(tree, Node) else tree
+                for tree in chunk
+            ]
+            pending.append(
+                (chunk, array_trees, executor.submit(_balance_chunk, array_trees))
+            )
+            # Keep every worker busy, with one more chunk queued for each, before waiting:
+            if len(pending) >= 2 * n_workers:
+                yield from _collect_chunk(*pending.popleft())
+        while pending:
+            yield from _collect_chunk(*pending.popleft())
+
+
+def _balance_chunk(trees: list[ArrayTree]) -> list[tuple[np.ndarray, np.ndarray]]:
+    results = []
+    for tree in trees:
+        array_balancer(tree)
+        results.append((tree.limit, tree.allocation))
+    return results
+
+
+def _collect_chunk(
+    chunk: tuple[Node | ArrayTree, ...], array_trees: list[ArrayTree], future: Future
+) -> Iterator[Node | ArrayTree]:
+    for tree, array_tree, (limit, allocation) in zip(
+        chunk, array_trees, future.result(), strict=True
+    ):
+        array_tree.limit = limit
+        array_tree.allocation = allocation
+        if isinstance(tree, Node):
+            array_tree.write_to(tree)
+        yield tree
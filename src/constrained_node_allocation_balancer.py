@@ -1,48 +1,125 @@
 import math
-from typing import Callable
+from collections.abc import Callable, Iterable
+from typing import Literal
 
 from logs import Logs
 from node import Node
+from water_filling import water_fill, water_fill_with_capped
 
 
-def constrained_node_allocation_balancer(tree: Node, return_logs: bool = False) -> None:
+def constrained_node_allocation_balancer(
+    tree: Node,
+    return_logs: bool = False,
+    solver: Literal["iterative", "water_filling"] = "iterative",
+    warm_start: bool = False,
+) -> None:
+    """Allocate the largest possible total to the tree's leaves, as evenly as possible subject to
+    the nodes' limits.
+
+    With `solver="iterative"`, the allocation of each node is split among its children evenly and
+    then the excess of any children exceeding their limits is redistributed among their siblings
+    with headroom, until no child exceeds its limit. With `solver="water_filling"`, each split is
+    instead computed directly by `water_fill`, in a number of steps bounded by the number of
+    children. The two give the same allocations (up to floating-point error) when the tree's leaves
+    have no shift constants.
+
+    With `warm_start=True`, the tree may hold the allocations of a previous solve, for example
+    after its limits have changed slightly. The root's allocation is kept if those allocations prove
+    that it is still the largest possible, and each node's allocation is first split among its
+    children assuming that the children that had reached their limits still do, which takes a
+    single pass over the children when that is the case.
+    """
     logs = Logs()
+    if return_logs:
+        logs.start(tree)
 
-    def logger(message: str, tree: Node):
+    def logger(message: str, nodes: Iterable[Node]):
         if return_logs:
-            logs.add(message, tree)
+            logs.add(message, nodes)
 
-    _set_root_allocation(tree, logger)
+    if warm_start and _root_allocation_is_still_maximal(tree):
+        logger(
+            f"Kept the root allocation {tree.allocation}, still the largest possible",
+            [],
+        )
+    else:
+        _set_root_allocation(tree, logger, check_allocations=(not warm_start))
     _adjust_inactive_limits(tree, logger)
-    _balance_allocations(tree, logger)
+    if solver == "iterative":
+        _balance_allocations(tree, logger, warm_start)
+    elif solver == "water_filling":
+        _balance_allocations_by_water_filling(tree, logger, warm_start)
+    else:
+        raise NotImplementedError
 
     if return_logs:
         return logs
 
 
-def _set_root_allocation(tree: Node, logger: Callable) -> None:
-    for node in tree.all_nodes:
-        if node.allocation != 0.0:
-            raise ValueError("All node allocations must start at 0.0.")
-    for leaf in tree.all_leaves:
-        ancestral_budgets = [
-            n.remaining_budget
-            for n in [leaf, *leaf.ancestor_chain]
-            if not math.isinf(n.limit)
-        ]
-        if len(ancestral_budgets) == 0:
+def _set_root_allocation(
+    tree: Node, logger: Callable, check_allocations: bool = True
+) -> None:
+    index = tree.index
+    if check_allocations:
+        for node in index.nodes:
+            if node.allocation != 0.0:
+                raise ValueError("All node allocations must start at 0.0.")
+    # Propagate the minimum limit along each path from the root, in depth-first order (in which
+    #     every node comes after its parent), to check that every leaf is constrained by its own
+    #     limit or that of one of its ancestors:
+    path_limits = [0.0] * len(index.nodes)
+    for position, node in enumerate(index.nodes):
+        parent_position = index.parent_positions[position]
+        path_limits[position] = (
+            node.limit
+            if parent_position == -1
+            else min(node.limit, path_limits[parent_position])
+        )
+        if len(node.children) == 0 and math.isinf(path_limits[position]):
             raise AncestorChainWithoutLimitError
-        leaf.allocation = min(ancestral_budgets)
-        for a in leaf.ancestor_chain:
-            a.allocation += leaf.allocation
-        logger(f"Allocated {min(ancestral_budgets) = } to leaf {leaf.id}", tree)
-    for descendant in tree.all_descendants:
-        descendant.allocation = 0.0
-    logger("Cleared allocations from all non-root nodes", tree)
+    # The largest possible allocation to each node is its limit (its budget, before any allocation)
+    #     or the sum of the largest possible allocations to its children, whichever is smaller.
+    #     Accumulate these from the leaves up, iterating in reverse depth-first order (in which
+    #     every node comes after its children):
+    children_max_allocations = [0.0] * len(index.nodes)
+    for position in reversed(range(len(index.nodes))):
+        node = index.nodes[position]
+        max_allocation = (
+            node.limit
+            if len(node.children) == 0
+            else min(node.limit, children_max_allocations[position])
+        )
+        parent_position = index.parent_positions[position]
+        if parent_position != -1:
+            children_max_allocations[parent_position] += max_allocation
+    tree.allocation = max_allocation  # The root is visited last.
+    logger(f"Set the root allocation to the largest possible {tree.allocation}", [tree])
+
+
+def _root_allocation_is_still_maximal(tree: Node) -> bool:
+    """Return whether the tree's allocations, as left by a previous solve, prove that the root's
+    allocation is still the largest possible under the tree's current limits.
+
+    This is the case if no node's allocation exceeds its limit and every leaf has a node at its
+    limit at or above it: the root's allocation is then the sum of the limits of the topmost nodes
+    at their limits, which no allocation can exceed.
+    """
+    index = tree.index
+    limit_reached_at_or_above = [False] * len(index.nodes)
+    for position, node in enumerate(index.nodes):
+        if node.allocation > node.limit:
+            return False
+        parent_position = index.parent_positions[position]
+        limit_reached_at_or_above[position] = node.allocation >= node.limit or (
+            parent_position != -1 and limit_reached_at_or_above[parent_position]
+        )
+        if len(node.children) == 0 and not limit_reached_at_or_above[position]:
+            return False
+    return True
 
 
 def _adjust_inactive_limits(tree: Node, logger: Callable) -> None:
-    for level, level_nodes in reversed(tree.nodes_by_level.items()):  # Root last.
+    for level, level_nodes in reversed(tree.index.nodes_by_level.items()):  # Root last.
         if level == 0:
             continue
         for node in level_nodes:
@@ -56,52 +133,118 @@ def _adjust_inactive_limits(tree: Node, logger: Callable) -> None:
                 logger(
                     f"Set limit of node {node.id} to the sum of its children's limits "
                     f"{children_throughput}",
-                    tree,
+                    [node],
                 )
 
 
-def _balance_allocations(tree: Node, logger: Callable) -> None:
-    for level_nodes in tree.nodes_by_level.values():
+def _balance_allocations(
+    tree: Node, logger: Callable, warm_start: bool = False
+) -> None:
+    for level_nodes in tree.index.nodes_by_level.values():
+        # Keep track of each parent's children with headroom, keyed by their positions in the tree
+        #     (and thus in the same order as the parent's children), updating them as allocations
+        #     cross limits rather than filtering the siblings of every node exceeding its limit:
+        headroom_by_parent: dict[int, dict[int, Node]] = {}
+        for node in level_nodes:
+            if node.parent is not None and node.has_headroom:
+                headroom_by_parent.setdefault(node.parent._position, {})[
+                    node._position
+                ] = node
         # Redistribute nodes' allocations until all nodes' limits are respected:
         while any(node.limit_exceeded for node in level_nodes):
             for node in level_nodes:
                 if node.limit_exceeded:
                     excess = node.allocation - node.limit
-                    siblings_with_headroom = node.siblings_with_headroom
+                    headroom = headroom_by_parent.setdefault(node.parent._position, {})
+                    siblings_with_headroom = list(headroom.values())
+                    sum_of_shift_constants = sum(
+                        sibling.sum_of_shift_constants_at_or_below
+                        for sibling in siblings_with_headroom
+                    )
+                    n_leaves = sum(
+                        sibling.n_leaves_at_or_below
+                        for sibling in siblings_with_headroom
+                    )
                     for sibling in siblings_with_headroom:
                         sibling.allocation += (
-                            (
-                                excess
-                                - sum(
-                                    sibling.sum_of_shift_constants_at_or_below
-                                    for sibling in siblings_with_headroom
-                                )
-                            )
-                            / sum(
-                                sibling.n_leaves_at_or_below
-                                for sibling in siblings_with_headroom
-                            )
+                            (excess - sum_of_shift_constants)
+                            / n_leaves
                             * sibling.n_leaves_at_or_below
                         ) + sibling.sum_of_shift_constants_at_or_below
+                        if not sibling.has_headroom:
+                            del headroom[sibling._position]
                     node.allocation -= excess
+                    if node.has_headroom:
+                        # Floating-point error left the node just under its limit:
+                        headroom[node._position] = node
+                        headroom_by_parent[node.parent._position] = dict(
+                            sorted(headroom.items())
+                        )
                     logger(
                         f"Redistributed {excess} from node {node.id} to siblings with headroom "
                         f"{[s.id for s in siblings_with_headroom]}",
-                        tree,
+                        [node, *siblings_with_headroom],
                     )
         for node in level_nodes:
-            for child in node.children:
-                child.allocation = (
-                    (node.allocation - node.sum_of_shift_constants_at_or_below)
-                    / node.n_leaves_at_or_below
-                    * child.n_leaves_at_or_below
-                ) + child.sum_of_shift_constants_at_or_below
+            allocations = _split_as_previously_capped(node) if warm_start else None
+            if allocations is None:
+                allocations = [
+                    (
+                        (node.allocation - node.sum_of_shift_constants_at_or_below)
+                        / node.n_leaves_at_or_below
+                        * child.n_leaves_at_or_below
+                    )
+                    + child.sum_of_shift_constants_at_or_below
+                    for child in node.children
+                ]
+            for child, allocation in zip(node.children, allocations, strict=True):
+                child.allocation = allocation
             if len(node.children) > 0:
                 logger(
                     f"Distributed {node.allocation} from node {node.id} to children "
                     f"{[c.id for c in node.children]}",
-                    tree,
+                    node.children,
+                )
+
+
+def _balance_allocations_by_water_filling(
+    tree: Node, logger: Callable, warm_start: bool = False
+) -> None:
+    for level_nodes in tree.index.nodes_by_level.values():
+        for node in level_nodes:
+            if len(node.children) == 0:
+                continue
+            allocations = _split_as_previously_capped(node) if warm_start else None
+            if allocations is None:
+                allocations = water_fill(
+                    total=node.allocation,
+                    limits=[c.allocation_limit for c in node.children],
+                    weights=[c.n_leaves_at_or_below for c in node.children],
+                    offsets=[
+                        c.sum_of_shift_constants_at_or_below for c in node.children
+                    ],
                 )
+            for child, allocation in zip(node.children, allocations, strict=True):
+                child.allocation = allocation
+            logger(
+                f"Distributed {node.allocation} from node {node.id} to children "
+                f"{[c.id for c in node.children]}",
+                node.children,
+            )
+
+
+def _split_as_previously_capped(node: Node) -> list[float] | None:
+    """Split the node's allocation among its children as `water_fill` would, assuming that the
+    children whose allocations (from a previous solve) are at their limits still reach them, or
+    return None if that is not the case.
+    """
+    return water_fill_with_capped(
+        total=node.allocation,
+        limits=[c.allocation_limit for c in node.children],
+        weights=[c.n_leaves_at_or_below for c in node.children],
+        offsets=[c.sum_of_shift_constants_at_or_below for c in node.children],
+        capped=[not c.has_headroom for c in node.children],
+    )
 
 
 class AncestorChainWithoutLimitError(Exception):
@@ -0,0 +1,167 @@
+import math
+from collections.abc import Callable, Iterable, Mapping
+
+from constrained_node_allocation_balancer import AncestorChainWithoutLimitError
+from node import Node
+from water_filling import water_fill
+
+
+class IncrementalBalancer:
+    """Keep a tree's allocations balanced as its limits and children change, re-splitting only the
+    allocations that are affected by each change.
+
+    The tree is balanced as by `constrained_node_allocation_balancer` with
+    `solver="water_filling"`, except that the nodes' limits are left as configured: the limits that
+    `_adjust_inactive_limits` would set (the nodes' "effective" limits) are kept by the balancer.
+
+    After a limit changes, only the effective limits of the node and its ancestors are recomputed,
+    and allocations are re-split from the root down, descending only into the changed node's
+    ancestors and into nodes whose allocations changed. After children are added or removed, the
+    tree's structural index and effective limits are recomputed in full, and allocations are
+    re-split in the same way.
+    """
+
+    tree: Node
+    _effective_limits: list[float]
+    """The effective limit of each node, by the node's position in the tree's index."""
+
+    def __init__(self, tree: Node) -> None:
+        self.tree = tree
+        self._refresh_effective_limits()
+        self._rebalance(dirty_positions=set(range(len(tree.index.nodes))))
+
+    def update_limit(self, node_id: str, new_limit: float) -> set[str]:
+        """Set the limit of the node with the given ID and rebalance the tree, returning the IDs of
+        the leaves whose allocations changed.
+        """
+        return self.update_limits({node_id: new_limit})
+
+    def update_limits(self, new_limits: Mapping[str, float]) -> set[str]:
+        """Set the limits of the nodes with the given IDs and rebalance the tree, returning the IDs
+        of the leaves whose allocations changed.
+        """
+        nodes = [self.tree.node_by_id(node_id) for node_id in new_limits]
+        old_limits = [node.limit for node in nodes]
+        for node, new_limit in zip(nodes, new_limits.values(), strict=True):
+            node.limit = new_limit
+        dirty_positions = self._ancestor_positions(nodes)
+        self._update_effective_limits(dirty_positions)
+        if math.isinf(self._effective_limits[0]):
+            for node, old_limit in zip(nodes, old_limits, strict=True):
+                node.limit = old_limit
+            self._update_effective_limits(dirty_positions)
+            raise AncestorChainWithoutLimitError
+        return self._rebalance(dirty_positions)
+
+    def add_child(self, parent_id: str, child: Node) -> set[str]:
+        """Add a child (or subtree) to the node with the given ID and rebalance the tree, returning
+        the IDs of the leaves whose allocations changed, including any leaves added.
+        """
+        self.tree.node_by_id(parent_id).add_child(child)
+        return self._rebalance_after_changing_children(
+            changed_nodes=child.all_nodes,
+            undo=(lambda: child.parent.remove_child(child)),
+        )
+
+    def remove_child(self, node_id: str) -> set[str]:
+        """Remove the node with the given ID (and its descendants) from the tree and rebalance the
+        tree, returning the IDs of the (remaining) leaves whose allocations changed.
+        """
+        node = self.tree.node_by_id(node_id)
+        parent = node.parent
+        if parent is None:
+            raise ValueError("The root node cannot be removed.")
+        child_index = parent.children.index(node)
+        parent.remove_child(node)
+        return self._rebalance_after_changing_children(
+            changed_nodes=[parent], undo=(lambda: parent.add_child(node, child_index))
+        )
+
+    def _rebalance_after_changing_children(
+        self, changed_nodes: Iterable[Node], undo: Callable
+    ) -> set[str]:
+        self._refresh_effective_limits()
+        if math.isinf(self._effective_limits[0]):
+            undo()
+            self._refresh_effective_limits()
+            raise AncestorChainWithoutLimitError
+        return self._rebalance(self._ancestor_positions(changed_nodes))
+
+    # ==============================================================================================
+    # Methods maintaining the nodes' effective limits:
+
+    def _refresh_effective_limits(self) -> None:
+        index = self.tree.index
+        self._effective_limits = [0.0] * len(index.nodes)
+        self._update_effective_limits(range(len(index.nodes)))
+
+    def _update_effective_limits(self, positions: Iterable[int]) -> None:
+        # Iterate in reverse depth-first order, in which every node comes after its children:
+        index = self.tree.index
+        for position in sorted(positions, reverse=True):
+            node = index.nodes[position]
+            if len(node.children) == 0:
+                self._effective_limits[position] = node.limit
+            else:
+                children_throughput = sum(
+                    self._effective_limits[child._position] for child in node.children
+                )
+                self._effective_limits[position] = min(node.limit, children_throughput)
+
+    def _ancestor_positions(self, nodes: Iterable[Node]) -> set[int]:
+        """Return the positions of the given nodes and all of their ancestors."""
+        positions: set[int] = set()
+        parent_positions = self.tree.index.parent_positions
+        for node in nodes:
+            position = node._position
+            while position != -1 and position not in positions:
+                positions.add(position)
+                position = parent_positions[position]
+        return positions
+
+    # ==============================================================================================
+    # Methods re-splitting allocations:
+
+    def _rebalance(self, dirty_positions: set[int]) -> set[str]:
+        """Re-split allocations from the root down, descending into nodes at `dirty_positions`
+        (whose children's effective limits may have changed) and into nodes whose allocations
+        changed, and return the IDs of the leaves whose allocations changed.
+        """
+        moved_leaf_ids: set[str] = set()
+        root = self.tree
+        stack: list[Node] = []
+        if self._set_allocation(root, self._effective_limits[0], moved_leaf_ids) or (
+            root._position in dirty_positions
+        ):
+            stack.append(root)
+        while stack:
+            node = stack.pop()
+            if len(node.children) == 0:
+                continue
+            allocations = water_fill(
+                total=node.allocation,
+                limits=[
+                    self._effective_limits[c._position]
+                    / getattr(c, "conversion_factor", 1.0)
+                    for c in node.children
+                ],
+                weights=[c.n_leaves_at_or_below for c in node.children],
+                offsets=[c.sum_of_shift_constants_at_or_below for c in node.children],
+            )
+            for child, allocation in zip(node.children, allocations, strict=True):
+                if self._set_allocation(child, allocation, moved_leaf_ids) or (
+                    child._position in dirty_positions
+                ):
+                    stack.append(child)
+        return moved_leaf_ids
+
+    @staticmethod
+    def _set_allocation(
+        node: Node, allocation: float, moved_leaf_ids: set[str]
+    ) -> bool:
+        if node.allocation == allocation:
+            return False
+        node.allocation = allocation
+        if len(node.children) == 0:
+            moved_leaf_ids.add(node.id)
+        return True
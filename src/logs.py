@@ -1,4 +1,8 @@
+from __future__ import annotations
+
+import dataclasses
 import math
+from collections.abc import Iterable, Iterator
 from copy import deepcopy
 from pathlib import Path
 from typing import Literal
@@ -6,17 +10,98 @@ from typing import Literal
 from node import Node
 
 
+@dataclasses.dataclass(frozen=True)
+class FieldChange:
+    node_id: str
+    field: Literal["allocation", "limit"]
+    old_value: float
+    new_value: float
+
+
+@dataclasses.dataclass(frozen=True)
+class LogEvent:
+    message: str
+    changes: tuple[FieldChange, ...]
+
+
 class Logs:
-    _tree_snapshots: dict[str, Node]
+    """A log of the steps taken by the balancer.
+
+    Rather than a copy of the tree for every step, the log holds a single copy of the tree as it was
+    before the first step, and for each step, a message and the changes that the step made to nodes'
+    allocations and limits. The tree as it was after any step is reconstructed from these only when
+    needed.
+    """
+
+    _initial_tree: Node | None
+    _events: list[LogEvent]
+    _allocations: list[float]
+    """The allocation of each node as of the latest step, by the node's position in the tree."""
+    _limits: list[float]
+    """The limit of each node as of the latest step, by the node's position in the tree."""
 
     def __init__(self) -> None:
-        self._tree_snapshots = {}
+        self._initial_tree = None
+        self._events = []
+        self._allocations = []
+        self._limits = []
 
-    def add(self, message: str, tree: Node) -> None:
-        self._tree_snapshots[message] = deepcopy(tree)
+    def start(self, tree: Node) -> None:
+        """Take a copy of the tree before the first step."""
+        self._initial_tree = deepcopy(tree)
+        self._events = []
+        self._allocations = [n.allocation for n in tree.all_nodes]
+        self._limits = [n.limit for n in tree.all_nodes]
+
+    def add(self, message: str, nodes: Iterable[Node]) -> None:
+        """Log a step, given the nodes whose allocations or limits the step may have changed."""
+        changes: list[FieldChange] = []
+        for node in nodes:
+            position = node.position
+            if node.allocation != self._allocations[position]:
+                changes.append(
+                    FieldChange(
+                        node.id,
+                        "allocation",
+                        self._allocations[position],
+                        node.allocation,
+                    )
+                )
+                self._allocations[position] = node.allocation
+            if node.limit != self._limits[position]:
+                changes.append(
+                    FieldChange(node.id, "limit", self._limits[position], node.limit)
+                )
+                self._limits[position] = node.limit
+        self._events.append(LogEvent(message, tuple(changes)))
+
+    @property
+    def events(self) -> list[LogEvent]:
+        return list(self._events)
+
+    def tree_at(self, step: int) -> Node:
+        """Return a copy of the tree as it was after the given step."""
+        tree = deepcopy(self._initial_tree)
+        for event in self._events[: step + 1]:
+            self._apply(event, tree)
+        return tree
+
+    def _trees(self) -> Iterator[tuple[str, Node]]:
+        """Yield each step's message and the tree as it was after the step, reusing a single copy of
+        the tree, which is only valid until the next step is yielded.
+        """
+        tree = deepcopy(self._initial_tree)
+        for event in self._events:
+            self._apply(event, tree)
+            yield event.message, tree
+
+    @staticmethod
+    def _apply(event: LogEvent, tree: Node) -> None:
+        for change in event.changes:
+            setattr(tree.node_by_id(change.node_id), change.field, change.new_value)
 
     def show(self, how: Literal["ascii", "mermaid"] = "ascii") -> None:
-        for message, tree in self._tree_snapshots.items():
+        for message, tree in self._trees():
             print(message)
             tree.show(
                 max_allocation_str_len=self._max_allocation_str_len,
@@ -30,7 +115,7 @@ class Logs:
     ) -> None:
         file = Path(file)
         with file.open(mode="w") as f:
-            for message, tree in self._tree_snapshots.items():
+            for message, tree in self._trees():
                 f.write(message + "\n")
                 f.write("\n")
                 f.write(f"```{'mermaid' if how == 'mermaid' else ''}\n")
@@ -46,6 +131,15 @@ class Logs:
                 f.write("```\n")
                 f.write("\n")
 
+    def _values(self, field: Literal["allocation", "limit"]) -> Iterator[float]:
+        """Yield every value that the given field of any node takes in any step."""
+        for node in self._initial_tree.all_nodes:
+            yield getattr(node, field)
+        for event in self._events:
+            for change in event.changes:
+                if change.field == field:
+                    yield change.new_value
+
     @property
     def _max_value(self) -> float:
         return max(self._max_allocation, self._max_limit)
@@ -60,17 +154,8 @@ class Logs:
 
     @property
     def _max_allocation(self) -> float:
-        return max(
-            n.allocation
-            for tree in self._tree_snapshots.values()
-            for n in tree.all_nodes
-        )
+        return max(self._values("allocation"))
 
     @property
     def _max_limit(self) -> float:
-        return max(
-            n.limit
-            for tree in self._tree_snapshots.values()
-            for n in tree.all_nodes
-            if not math.isinf(n.limit)
-        )
+        return max(v for v in self._values("limit") if not math.isinf(v))
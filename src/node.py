@@ -1,47 +1,87 @@
 from __future__ import annotations
 
+import copy
 import dataclasses
 import math
-from itertools import groupby
+from collections.abc import Iterator
 from typing import Any, Literal, override
 
 import python_to_mermaid
 
 from ascii_barplot import make_ascii_barplot, make_ascii_barplot_with_marker
+from tree_index import TreeIndex
 from utils import pad
 
 
-@dataclasses.dataclass(kw_only=True)
+@dataclasses.dataclass(kw_only=True, slots=True)
 class Node:
-    id: str = dataclasses.field(init=False)
-    _id_suffix: str = dataclasses.field(init=False)
     limit: float = float("inf")
     children: list[Node]
     parent: Node | None = dataclasses.field(default=None, repr=False)
-    level: int = dataclasses.field(init=False, repr=False)
     allocation: float = 0.0
+    _index: TreeIndex | None = dataclasses.field(
+        init=False, default=None, repr=False, compare=False
+    )
+    _position: int = dataclasses.field(
+        init=False, default=-1, repr=False, compare=False
+    )
 
     def __post_init__(self) -> None:
         for child in self.children:
             child.parent = self
-        # Set IDs and levels if this is the root node:
-        if self.parent is None:
-            self._set_ids()
-            self._set_levels()
+            child.invalidate_index()
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> Node:
+        # Copy the whole tree containing the node in one pass over its nodes, rather than
+        #     recursively (which would raise `RecursionError` for deep trees):
+        if id(self) not in memo:
+            nodes = self.root.all_nodes
+            for node in nodes:
+                node_copy = copy.copy(node)
+                node_copy._index = None
+                node_copy._position = -1
+                memo[id(node)] = node_copy
+            for node in nodes:
+                node_copy = memo[id(node)]
+                node_copy.children = [memo[id(child)] for child in node.children]
+                if node.parent is not None:
+                    node_copy.parent = memo[id(node.parent)]
+        return memo[id(self)]
 
-    def _set_ids(self, starting_at: str = "1", separator: str = ".") -> None:
-        self._id_suffix = starting_at
-        if self.parent is None:
-            self.id = self._id_suffix
-        else:
-            self.id = self.parent.id + separator + self._id_suffix
-        for i, child in enumerate(self.children):
-            child._set_ids(starting_at=str(i + 1))
+    @property
+    def id(self) -> str:
+        """Return the node's path from the root node as 1-based child indices, such as "1.2.1".
 
-    def _set_levels(self, starting_level: int = 0) -> None:
-        self.level = starting_level
-        for child in self.children:
-            child._set_levels(starting_level=(self.level + 1))
+        This is computed from the tree's structural index each time it is accessed, by walking up
+        the tree, so is meant for display and lookups by users rather than for use in loops over
+        many nodes, which should use `position`.
+        """
+        index = self.index
+        child_numbers = index.child_numbers
+        parent_positions = index.parent_positions
+        id_suffixes: list[str] = []
+        position = self._position
+        while position != -1:
+            id_suffixes.append(str(child_numbers[position]))
+            position = parent_positions[position]
+        return ".".join(reversed(id_suffixes))
+
+    @property
+    def _id_suffix(self) -> str:
+        return str(self.index.child_numbers[self._position])
+
+    @property
+    def position(self) -> int:
+        """Return an integer ID of the node: its position in depth-first order in its tree, which
+        changes only when children are added to or removed from the tree.
+        """
+        if self._index is None or not self._index.valid:
+            TreeIndex.build(self.root)
+        return self._position
+
+    @property
+    def level(self) -> int:
+        return self.index.levels[self._position]
 
     # ==============================================================================================
     # Methods comparing the node's allocation to its limit:
@@ -58,41 +98,101 @@ class Node:
     def has_headroom(self) -> bool:
         return self.allocation < self.limit
 
+    @property
+    def allocation_limit(self) -> float:
+        """Return the node's limit in the units of its allocation."""
+        return self.limit
+
     # ==============================================================================================
     # Methods concerning the structure of the tree:
 
+    @property
+    def root(self) -> Node:
+        """Return the root node of the tree containing the node."""
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    @property
+    def index(self) -> TreeIndex:
+        """Return the structural index of the tree containing the node, building it first if it
+        does not exist yet or has been invalidated.
+        """
+        if self._index is None or not self._index.valid:
+            TreeIndex.build(self.root)
+        return self._index
+
+    def invalidate_index(self) -> None:
+        """Mark the tree's structural index as stale, such that it is rebuilt when next accessed.
+
+        This is done automatically by `add_child` and `remove_child`, but must be done manually
+        after modifying a node's `children` list directly, or a leaf's `conversion_factor` or
+        `shift_constant`.
+        """
+        if self._index is not None:
+            self._index.valid = False
+
+    def add_child(self, child: Node, child_index: int | None = None) -> None:
+        """Add a child to the node, after its other children or at `child_index`."""
+        self.invalidate_index()
+        child.invalidate_index()
+        if child_index is None:
+            self.children.append(child)
+        else:
+            self.children.insert(child_index, child)
+        child.parent = self
+
+    def remove_child(self, child: Node) -> None:
+        self.invalidate_index()
+        self.children.remove(child)
+        child.parent = None
+
+    def node_by_id(self, id: str, separator: str = ".") -> Node:
+        """Return the node of the tree with the given ID, by following the ID's path from the root
+        node rather than searching the tree.
+        """
+        root_id_suffix, *id_suffixes = id.split(separator)
+        node = self.root
+        if root_id_suffix != node._id_suffix:
+            raise KeyError(id)
+        for id_suffix in id_suffixes:
+            child_index = int(id_suffix) - 1
+            if not 0 <= child_index < len(node.children):
+                raise KeyError(id)
+            node = node.children[child_index]
+        return node
+
     @property
     def all_descendants(self) -> list[Node]:
         """Return a list of all the node's children, those children's children, and so on, until
         leaf nodes are reached, in depth-first order.
         """
-        descendants: list[Node] = []
-        for child in self.children:
-            descendants.append(child)
-            descendants += child.all_descendants
-        return descendants
+        index = self.index
+        return index.nodes[self._position + 1 : index.subtree_ends[self._position]]
 
     @property
     def all_nodes(self) -> list[Node]:
         """Return a list of all the tree's nodes, in depth-first order."""
-        return [self, *self.all_descendants]
+        index = self.index
+        return index.nodes[self._position : index.subtree_ends[self._position]]
 
     @property
     def nodes_by_level(self) -> dict[int, list[Node]]:
         """Return a list of nodes for each level in the tree."""
-        return {
-            k: list(g)
-            for k, g in groupby(
-                sorted(self.all_nodes, key=(lambda node: node.level)),
-                key=(lambda node: node.level),
-            )
-        }
+        index = self.index
+        if self.parent is None:
+            return {k: list(v) for k, v in index.nodes_by_level.items()}
+        nodes_by_level: dict[int, list[Node]] = {}
+        for node in self.all_nodes:
+            nodes_by_level.setdefault(node.level, []).append(node)
+        return nodes_by_level
 
     @property
     def siblings(self) -> list[Node] | None:
         """If the node is not the root node, return a list of nodes sharing the same parent."""
         if self.parent is not None:
-            return [n for n in self.parent.nodes_by_level[self.level] if n is not self]
+            return [n for n in self.parent.children if n is not self]
 
     @property
     def siblings_with_headroom(self) -> list[Node] | None:
@@ -103,10 +203,10 @@ class Node:
     def ancestor_chain(self) -> list[Node]:
         """Return a list containing the node's parent, grandparent, and so on until the root node."""
         ancestor_chain: list[Node] = []
-        if self.parent is not None:
-            ancestor_chain.append(self.parent)
-            if self.parent.parent is not None:
-                ancestor_chain += self.parent.ancestor_chain
+        node = self.parent
+        while node is not None:
+            ancestor_chain.append(node)
+            node = node.parent
         return ancestor_chain
 
     # ----------------------------------------------------------------------------------------------
@@ -114,13 +214,10 @@ class Node:
 
     @property
     def all_leaves(self) -> list[Node]:
-        if len(self.children) > 0:
-            leaves: list[Node] = []
-            for child in self.children:
-                leaves += child.all_leaves
-            return leaves
-        else:
-            return [self]  # We are the leaf.
+        index = self.index
+        return index.leaves[
+            index.leaf_starts[self._position] : index.leaf_ends[self._position]
+        ]
 
     @property
     def n_leaves_at_or_below(self) -> float:
@@ -129,12 +226,11 @@ class Node:
         If there are non-1.0 conversion factors, this returns the number of leaves adjusted by their
         conversion factors.
         """
-
-        return sum(leaf.conversion_factor for leaf in self.all_leaves)
+        return self.index.n_leaves_at_or_below[self._position]
 
     @property
     def sum_of_shift_constants_at_or_below(self) -> float:
-        return sum(leaf.shift_constant for leaf in self.all_leaves)
+        return self.index.sum_of_shift_constants_at_or_below[self._position]
 
     @property
     def all_leaf_allocations(self) -> dict[str, float]:
@@ -208,43 +304,57 @@ class Node:
         max_allocation_str_len: int,
         max_limit_str_len: int,
         indent_per_level: int = 4,
-        root: bool = True,
-        header: str = "",
-        last: bool = True,
         **node_repr_kwargs: dict[str, Any],
     ) -> str:
-        elbow = "└───"
-        pipe = "│   "
-        tee = "├───"
-        blank = "    "
-        text = (
-            ("" if root else "\n")
-            + header
-            + ("" if root else elbow if last else tee)
-            + pad(self._id_suffix, max_id_suffix_len)
-            + " "
-            + " " * indent_per_level * (max_depth - self.level)
-            + f"{pad(f'{self.allocation:.3f}', max_allocation_str_len)}"
-            + (
-                " " * (4 + max_limit_str_len)
-                if math.isinf(self.limit)
-                else f" / {pad(f'{self.limit:.3f}', max_limit_str_len)} "
-            )
-            + self._ascii_barplot(**node_repr_kwargs)
-        )
-        for i, child in enumerate(self.children):
-            text += child._tree_repr(
+        return "\n".join(
+            self._tree_repr_lines(
                 max_id_suffix_len,
                 max_depth,
                 max_allocation_str_len,
                 max_limit_str_len,
                 indent_per_level,
-                root=False,
-                header=(header + ("" if root else blank if last else pipe)),
-                last=(i == len(self.children) - 1),
                 **node_repr_kwargs,
             )
-        return text
+        )
+
+    def _tree_repr_lines(
+        self,
+        max_id_suffix_len: int,
+        max_depth: int,
+        max_allocation_str_len: int,
+        max_limit_str_len: int,
+        indent_per_level: int = 4,
+        **node_repr_kwargs: dict[str, Any],
+    ) -> Iterator[str]:
+        elbow = "└───"
+        pipe = "│   "
+        tee = "├───"
+        blank = "    "
+        # Traverse the subtree in depth-first order using an explicit stack of (node, header, last)
+        #     tuples, where `header` is the text drawn for the node's ancestors (None for this node):
+        stack: list[tuple[Node, str | None, bool]] = [(self, None, True)]
+        while stack:
+            node, header, last = stack.pop()
+            yield (
+                ("" if header is None else header + (elbow if last else tee))
+                + pad(node._id_suffix, max_id_suffix_len)
+                + " "
+                + " " * indent_per_level * (max_depth - node.level)
+                + f"{pad(f'{node.allocation:.3f}', max_allocation_str_len)}"
+                + (
+                    " " * (4 + max_limit_str_len)
+                    if math.isinf(node.limit)
+                    else f" / {pad(f'{node.limit:.3f}', max_limit_str_len)} "
+                )
+                + node._ascii_barplot(**node_repr_kwargs)
+            )
+            children_header = (
+                "" if header is None else header + (blank if last else pipe)
+            )
+            stack.extend(
+                (child, children_header, i == len(node.children) - 1)
+                for i, child in reversed(list(enumerate(node.children)))
+            )
 
     def _ascii_barplot(
         self, max_value: float, max_bar_width: int, blank: str = " "
@@ -267,7 +377,7 @@ class Node:
         return f"|{barplot}"
 
 
-@dataclasses.dataclass(kw_only=True)
+@dataclasses.dataclass(kw_only=True, slots=True)
 class LeafNode(Node):
     children: list[Node] = dataclasses.field(init=False, default_factory=list)
 
@@ -294,3 +404,8 @@ class LeafNode(Node):
     @property
     def has_headroom(self) -> bool:
         return self.allocation * self.conversion_factor < self.limit
+
+    @override
+    @property
+    def allocation_limit(self) -> float:
+        return self.limit / self.conversion_factor
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import dataclasses
+from array import array
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from node import Node
+
+
+@dataclasses.dataclass(slots=True)
+class TreeIndex:
+    """Structural aggregates of a tree, computed once in a single traversal from its root.
+
+    Nodes are referred to by their position in depth-first (pre-order) order, such that the nodes
+    at or below the node at position `i` are exactly `nodes[i:subtree_ends[i]]`, and the leaves
+    at or below it are exactly `leaves[leaf_starts[i]:leaf_ends[i]]`. Per-node numbers are stored in
+    typed arrays (of 8-byte integers or floats) rather than lists of Python objects.
+
+    The index only describes the tree's structure and its leaves' conversion factors and shift
+    constants, not any limits or allocations. It is marked as invalid (see `Node.invalidate_index`)
+    whenever children are added to or removed from a node of the tree, and is then rebuilt the next
+    time it is accessed.
+    """
+
+    nodes: list[Node]
+    leaves: list[Node]
+    parent_positions: array[int]
+    """The position of each node's parent, or -1 for the root node."""
+    child_numbers: array[int]
+    """The 1-based index of each node among its parent's children, or 1 for the root node."""
+    levels: array[int]
+    subtree_ends: array[int]
+    leaf_starts: array[int]
+    leaf_ends: array[int]
+    n_leaves_at_or_below: array[float]
+    sum_of_shift_constants_at_or_below: array[float]
+    nodes_by_level: dict[int, list[Node]]
+    valid: bool = True
+
+    @classmethod
+    def build(cls, root: Node) -> TreeIndex:
+        nodes: list[Node] = []
+        leaves: list[Node] = []
+        parent_positions = array("q")
+        child_numbers = array("q")
+        levels = array("q")
+        leaf_starts = array("q")
+        nodes_by_level: dict[int, list[Node]] = {}
+        # Traverse the tree in depth-first order using an explicit stack of (node, parent position,
+        #     child number, level) tuples, pushing children in reverse so that they are popped in
+        #     order:
+        stack: list[tuple[Node, int, int, int]] = [(root, -1, 1, 0)]
+        while stack:
+            node, parent_position, child_number, level = stack.pop()
+            position = len(nodes)
+            nodes.append(node)
+            parent_positions.append(parent_position)
+            child_numbers.append(child_number)
+            levels.append(level)
+            leaf_starts.append(len(leaves))
+            nodes_by_level.setdefault(level, []).append(node)
+            if len(node.children) == 0:
+                leaves.append(node)
+            stack.extend(
+                (child, position, i + 1, level + 1)
+                for i, child in reversed(list(enumerate(node.children)))
+            )
+
+        n_nodes = len(nodes)
+        subtree_ends = array("q", range(1, n_nodes + 1))
+        leaf_ends = array(
+            "q",
+            (
+                leaf_start + (1 if len(node.children) == 0 else 0)
+                for node, leaf_start in zip(nodes, leaf_starts, strict=True)
+            ),
+        )
+        n_leaves_at_or_below = array("d", bytes(8 * n_nodes))
+        sum_of_shift_constants_at_or_below = array("d", bytes(8 * n_nodes))
+        # In depth-first order, every node comes after its parent, so iterating in reverse visits
+        #     children before their parents and lets each node's aggregates be accumulated into its
+        #     parent's:
+        for position in reversed(range(n_nodes)):
+            node = nodes[position]
+            if len(node.children) == 0:
+                n_leaves_at_or_below[position] = getattr(node, "conversion_factor", 1.0)
+                sum_of_shift_constants_at_or_below[position] = getattr(
+                    node, "shift_constant", 0.0
+                )
+            parent_position = parent_positions[position]
+            if parent_position != -1:
+                subtree_ends[parent_position] = max(
+                    subtree_ends[parent_position], subtree_ends[position]
+                )
+                leaf_ends[parent_position] = max(
+                    leaf_ends[parent_position], leaf_ends[position]
+                )
+                n_leaves_at_or_below[parent_position] += n_leaves_at_or_below[position]
+                sum_of_shift_constants_at_or_below[
+                    parent_position
+                ] += sum_of_shift_constants_at_or_below[position]
+
+        index = cls(
+            nodes=nodes,
+            leaves=leaves,
+            parent_positions=parent_positions,
+            child_numbers=child_numbers,
+            levels=levels,
+            subtree_ends=subtree_ends,
+            leaf_starts=leaf_starts,
+            leaf_ends=leaf_ends,
+            n_leaves_at_or_below=n_leaves_at_or_below,
+            sum_of_shift_constants_at_or_below=sum_of_shift_constants_at_or_below,
+            nodes_by_level=nodes_by_level,
+        )
+        for position, node in enumerate(nodes):
+            node._index = index
+            node._position = position
+        return index
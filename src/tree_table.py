@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import csv
+import dataclasses
+from collections.abc import Hashable, Iterable
+from pathlib import Path
+
+from node import LeafNode, Node
+
+COLUMNS = (
+    "node_id",
+    "parent_id",
+    "limit",
+    "conversion_factor",
+    "shift_constant",
+    "allocation",
+)
+
+
+@dataclasses.dataclass
+class TreeTable:
+    """A tree as flat columns, with one row per node.
+
+    The root node is the row whose `parent_id` is None (or an empty string, as read from a CSV
+    file). Rows may be in any order, except that the children of each node are in the order of
+    their rows. Nodes without children become `LeafNode`s, and the `conversion_factor` and
+    `shift_constant` of any other node are ignored.
+    """
+
+    node_id: list[Hashable]
+    parent_id: list[Hashable | None]
+    limit: list[float] | None = None
+    conversion_factor: list[float] | None = None
+    shift_constant: list[float] | None = None
+    allocation: list[float] | None = None
+
+    def __post_init__(self) -> None:
+        # Accept any iterables (such as NumPy arrays) and default the optional columns:
+        self.node_id = _to_list(self.node_id)
+        self.parent_id = _to_list(self.parent_id)
+        n_rows = len(self.node_id)
+        self.limit = _float_column(self.limit, n_rows, float("inf"))
+        self.conversion_factor = _float_column(self.conversion_factor, n_rows, 1.0)
+        self.shift_constant = _float_column(self.shift_constant, n_rows, 0.0)
+        self.allocation = _float_column(self.allocation, n_rows, 0.0)
+        for column in COLUMNS[1:]:
+            if len(getattr(self, column)) != n_rows:
+                raise ValueError(f"Column `{column}` has a different number of rows.")
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.node_id)
+
+    @classmethod
+    def from_parent_indices(
+        cls,
+        parent: Iterable[int],
+        limit: Iterable[float] | None = None,
+        conversion_factor: Iterable[float] | None = None,
+        shift_constant: Iterable[float] | None = None,
+        allocation: Iterable[float] | None = None,
+    ) -> TreeTable:
+        """Return a table of nodes identified by their row numbers, given the row number of each
+        node's parent, or -1 for the root node.
+        """
+        parent = _to_list(parent)
+        return cls(
+            node_id=range(len(parent)),
+            parent_id=[None if p == -1 else p for p in parent],
+            limit=limit,
+            conversion_factor=conversion_factor,
+            shift_constant=shift_constant,
+            allocation=allocation,
+        )
+
+    @classmethod
+    def from_tree(cls, tree: Node) -> TreeTable:
+        """Return a table of the tree's nodes in depth-first order, identified by their IDs."""
+        nodes = tree.all_nodes
+        ids_by_position = {node.position: node.id for node in nodes}
+        return cls(
+            node_id=list(ids_by_position.values()),
+            parent_id=[
+                None if node is tree else ids_by_position[node.parent.position]
+                for node in nodes
+            ],
+            limit=[node.limit for node in nodes],
+            conversion_factor=[
+                getattr(node, "conversion_factor", 1.0) for node in nodes
+            ],
+            shift_constant=[getattr(node, "shift_constant", 0.0) for node in nodes],
+            allocation=[node.allocation for node in nodes],
+        )
+
+    @classmethod
+    def read_csv(cls, file: Path | str) -> TreeTable:
+        """Read a table from a CSV file with a header row naming its columns, of which only
+        `node_id` and `parent_id` are required.
+        """
+        with Path(file).open(newline="") as f:
+            reader = csv.DictReader(f)
+            columns = {c: [] for c in reader.fieldnames or [] if c in COLUMNS}
+            for row in reader:
+                for column, values in columns.items():
+                    values.append(row[column])
+        return cls(**columns)
+
+    def write_csv(self, file: Path | str) -> None:
+        with Path(file).open(mode="w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(
+                zip(
+                    self.node_id,
+                    ["" if p is None else p for p in self.parent_id],
+                    self.limit,
+                    self.conversion_factor,
+                    self.shift_constant,
+                    self.allocation,
+                    strict=True,
+                )
+            )
+
+    def to_tree(self) -> Node:
+        """Build the tree of `Node`s and `LeafNode`s in a single pass over the rows."""
+        order, children_rows = self._traversal_order()
+        nodes: list[Node | None] = [None] * self.n_rows
+        # Create nodes in reverse traversal order, such that each node's children exist before it:
+        for row in reversed(order):
+            if len(children_rows[row]) == 0:
+                nodes[row] = LeafNode(
+                    limit=self.limit[row],
+                    allocation=self.allocation[row],
+                    conversion_factor=self.conversion_factor[row],
+                    shift_constant=self.shift_constant[row],
+                )
+            else:
+                nodes[row] = Node(
+                    limit=self.limit[row],
+                    allocation=self.allocation[row],
+                    children=[nodes[child_row] for child_row in children_rows[row]],
+                )
+        return nodes[order[0]]
+
+    def update_from_tree(self, tree: Node) -> None:
+        """Copy the limits and allocations of the tree's nodes into the table's rows, such as after
+        balancing the tree that was built from the table.
+        """
+        order, children_rows = self._traversal_order()
+        stack: list[tuple[int, Node]] = [(order[0], tree)]
+        while stack:
+            row, node = stack.pop()
+            if len(children_rows[row]) != len(node.children):
+                raise ValueError("The tree has a different structure than the table.")
+            self.limit[row] = node.limit
+            self.allocation[row] = node.allocation
+            stack.extend(zip(children_rows[row], node.children, strict=True))
+
+    def _traversal_order(self) -> tuple[list[int], list[list[int]]]:
+        """Return the rows in breadth-first order from the root, and the rows of each row's
+        children, after checking that the rows form a single tree.
+        """
+        rows_by_id: dict[Hashable, int] = {}
+        for row, node_id in enumerate(self.node_id):
+            if node_id in rows_by_id:
+                raise ValueError(f"Duplicate node ID: {node_id!r}.")
+            rows_by_id[node_id] = row
+
+        root_rows: list[int] = []
+        orphan_ids: list[Hashable] = []
+        children_rows: list[list[int]] = [[] for _ in range(self.n_rows)]
+        for row, parent_id in enumerate(self.parent_id):
+            if parent_id is None or parent_id == "":
+                root_rows.append(row)
+            elif parent_id in rows_by_id:
+                children_rows[rows_by_id[parent_id]].append(row)
+            else:
+                orphan_ids.append(self.node_id[row])
+        if orphan_ids:
+            raise ValueError(f"Nodes with unknown parents: {orphan_ids!r}.")
+        if len(root_rows) != 1:
+            raise ValueError(
+                f"There must be exactly one root node, but there are {len(root_rows)}."
+            )
+
+        order = root_rows
+        for row in order:  # Extended while iterating.
+            order.extend(children_rows[row])
+        # Every node has a parent in the table, so any node not reached from the root must be in
+        #     (or below) a cycle:
+        if len(order) < self.n_rows:
+            reached = set(order)
+            raise ValueError(
+                "Nodes in or below a cycle: "
+                f"{[self.node_id[r] for r in range(self.n_rows) if r not in reached]!r}."
+            )
+        return order, children_rows
+
+
+def _to_list(column: Iterable) -> list:
+    return column.tolist() if hasattr(column, "tolist") else list(column)
+
+
+def _float_column(
+    column: Iterable[float | str] | None, n_rows: int, default: float
+) -> list[float]:
+    if column is None:
+        return [default] * n_rows
+    return [float(value) for value in _to_list(column)]
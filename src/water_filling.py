@@ -0,0 +1,82 @@
+import math
+from collections.abc import Sequence
+
+
+def water_fill(
+    total: float,
+    limits: Sequence[float],
+    weights: Sequence[float],
+    offsets: Sequence[float],
+) -> list[float]:
+    """Split `total` among recipients as evenly as possible subject to their limits.
+
+    Each recipient `i` is given `min(limits[i], level * weights[i] + offsets[i])`, where `level` is
+    common to all recipients and chosen such that the allocations sum to `total`. This is the split
+    that repeatedly redistributing the excess of recipients exceeding their limits among the
+    recipients with headroom converges to, found instead by sorting the recipients by the level at
+    which each reaches its limit and sweeping over them once, capping them in that order until the
+    remaining recipients can absorb the remaining total. This takes O(k log k) time for k recipients.
+
+    If the recipients' limits sum to less than `total`, every recipient is given its limit.
+    """
+    k = len(limits)
+    # The level at which each recipient reaches its limit:
+    thresholds = [
+        (limits[i] - offsets[i]) / weights[i] if not math.isinf(limits[i]) else math.inf
+        for i in range(k)
+    ]
+    order = sorted(range(k), key=(lambda i: thresholds[i]))
+
+    # Suffix sums of the weights and offsets of the recipients not (yet) capped, in sorted order:
+    remaining_weights = [0.0] * (k + 1)
+    remaining_offsets = [0.0] * (k + 1)
+    for j in reversed(range(k)):
+        remaining_weights[j] = remaining_weights[j + 1] + weights[order[j]]
+        remaining_offsets[j] = remaining_offsets[j + 1] + offsets[order[j]]
+
+    level = math.inf
+    capped_total = 0.0
+    for j, i in enumerate(order):
+        candidate_level = (
+            total - capped_total - remaining_offsets[j]
+        ) / remaining_weights[j]
+        if candidate_level <= thresholds[i]:
+            level = candidate_level
+            break
+        # Recipient `i` reaches its limit before the total is used up:
+        capped_total += limits[i]
+
+    return [min(limits[i], level * weights[i] + offsets[i]) for i in range(k)]
+
+
+def water_fill_with_capped(
+    total: float,
+    limits: Sequence[float],
+    weights: Sequence[float],
+    offsets: Sequence[float],
+    capped: Sequence[bool],
+) -> list[float] | None:
+    """Return the same split as `water_fill`, given which recipients reach their limits, or None if
+    that guess is wrong.
+
+    This takes O(k) time for k recipients, without sorting them, so is a cheap first attempt when a
+    good guess is available, such as which recipients reached their limits in a previous split.
+    """
+    k = len(limits)
+    capped_total = sum(limits[i] for i in range(k) if capped[i])
+    remaining_weight = sum(weights[i] for i in range(k) if not capped[i])
+    remaining_offset = sum(offsets[i] for i in range(k) if not capped[i])
+    if remaining_weight == 0.0 or math.isinf(capped_total):
+        return None
+    level = (total - capped_total - remaining_offset) / remaining_weight
+    allocations = [level * weights[i] + offsets[i] for i in range(k)]
+    for i in range(k):
+        # Each capped recipient must reach its limit at or below the level, and each other
+        #     recipient must not exceed its limit at the level:
+        if capped[i]:
+            if allocations[i] < limits[i]:
+                return None
+            allocations[i] = limits[i]
+        elif allocations[i] > limits[i]:
+            return None
+    return allocations
@@ -0,0 +1,24 @@
+import random
+
+from node import LeafNode, Node
+
+
+def make_random_tree(
+    rng: random.Random, depth: int = 0, with_leaf_parameters: bool = False
+) -> Node:
+    limit = rng.choice([float("inf"), rng.randint(1, 30)]) if depth > 0 else 50
+    if depth == 3 or (depth > 0 and rng.random() < 0.3):
+        return LeafNode(
+            limit=rng.choice([float("inf"), rng.randint(1, 10)]),
+            conversion_factor=(
+                rng.choice([0.5, 1.0, 2.0]) if with_leaf_parameters else 1.0
+            ),
+            shift_constant=rng.choice([0.0, 0.25]) if with_leaf_parameters else 0.0,
+        )
+    return Node(
+        limit=limit,
+        children=[
+            make_random_tree(rng, depth + 1, with_leaf_parameters)
+            for _ in range(rng.randint(1, 4))
+        ],
+    )
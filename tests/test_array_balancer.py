@@ -0,0 +1,100 @@
+import random
+
+import numpy as np
+import pytest
+from random_trees import make_random_tree
+
+from array_balancer import array_balancer, array_balancer_sweep
+from array_tree import ArrayTree
+from constrained_node_allocation_balancer import (
+    AncestorChainWithoutLimitError,
+    constrained_node_allocation_balancer,
+)
+from node import LeafNode, Node
+
+
+def test_array_tree_layout() -> None:
+    tree = ArrayTree.from_node(
+        Node(
+            limit=4,
+            children=[
+                Node(children=[LeafNode(limit=1), LeafNode(limit=2)]),
+                LeafNode(limit=3, conversion_factor=2.0, shift_constant=0.5),
+            ],
+        )
+    )
+    assert tree.parent.tolist() == [-1, 0, 0, 1, 1]
+    assert tree.limit.tolist() == [4, float("inf"), 3, 1, 2]
+    assert tree.level.tolist() == [0, 1, 1, 2, 2]
+    assert tree.n_children.tolist() == [2, 2, 0, 0, 0]
+    assert tree.n_leaves_at_or_below.tolist() == [4, 2, 2, 1, 1]
+    assert tree.sum_of_shift_constants_at_or_below.tolist() == [0.5, 0, 0.5, 0, 0]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_converting_to_and_from_node_is_lossless(seed: int) -> None:
+    root = make_random_tree(random.Random(seed), with_leaf_parameters=True)
+    constrained_node_allocation_balancer(root, solver="water_filling")
+    converted = ArrayTree.from_node(root).to_node()
+    assert [
+        (n.id, type(n), n.limit, n.allocation, n.n_leaves_at_or_below)
+        for n in converted.all_nodes
+    ] == [
+        (n.id, type(n), n.limit, n.allocation, n.n_leaves_at_or_below)
+        for n in root.all_nodes
+    ]
+
+
+def test_raising_if_any_branches_without_limit() -> None:
+    with pytest.raises(AncestorChainWithoutLimitError):
+        array_balancer(
+            ArrayTree.from_node(
+                Node(children=[LeafNode(limit=1), LeafNode(limit=float("inf"))])
+            )
+        )
+
+
+@pytest.mark.parametrize("with_leaf_parameters", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_array_balancer_matches_water_filling_solver(
+    seed: int, with_leaf_parameters: bool
+) -> None:
+    # Given:
+    root = make_random_tree(
+        random.Random(seed), with_leaf_parameters=with_leaf_parameters
+    )
+    tree = ArrayTree.from_node(root)
+    # When:
+    constrained_node_allocation_balancer(root, solver="water_filling")
+    array_balancer(tree)
+    # Then:
+    expected = ArrayTree.from_node(root)
+    np.testing.assert_allclose(tree.allocation, expected.allocation)
+    np.testing.assert_array_equal(tree.limit, expected.limit)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sweep_matches_balancing_each_scenario(seed: int) -> None:
+    # Given:
+    rng = np.random.default_rng(seed)
+    tree = ArrayTree.from_node(
+        make_random_tree(random.Random(seed), with_leaf_parameters=True)
+    )
+    limits = tree.limit * rng.uniform(0.5, 1.5, size=(5, tree.n_nodes))
+    # When:
+    allocations = array_balancer_sweep(tree, limits)
+    # Then:
+    assert allocations.shape == (5, tree.is_leaf.sum())
+    for scenario_limits, scenario_allocations in zip(limits, allocations, strict=True):
+        scenario = ArrayTree(
+            parent=tree.parent,
+            limit=scenario_limits,
+            allocation=np.zeros(tree.n_nodes),
+            conversion_factor=tree.conversion_factor,
+            shift_constant=tree.shift_constant,
+            is_leaf_node=tree.is_leaf_node,
+        )
+        array_balancer(scenario)
+        np.testing.assert_allclose(
+            scenario_allocations, scenario.allocation[tree.is_leaf]
+        )
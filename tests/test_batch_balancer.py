@@ -0,0 +1,39 @@
+import random
+
+import numpy as np
+import pytest
+from random_trees import make_random_tree
+
+from array_balancer import array_balancer
+from array_tree import ArrayTree
+from batch_balancer import balance_many
+from constrained_node_allocation_balancer import AncestorChainWithoutLimitError
+from node import LeafNode, Node
+
+
+def test_balance_many() -> None:
+    # Given:
+    roots = [make_random_tree(random.Random(seed)) for seed in range(50)]
+    array_trees = [ArrayTree.from_node(root) for root in roots]
+    expected = [ArrayTree.from_node(root) for root in roots]
+    for tree in expected:
+        array_balancer(tree)
+    # When:
+    balanced_roots = list(balance_many(roots, max_workers=2, chunksize=4))
+    balanced_array_trees = list(balance_many(array_trees, max_workers=2, chunksize=4))
+    # Then:
+    assert all(a is b for a, b in zip(balanced_roots, roots, strict=True))
+    assert all(a is b for a, b in zip(balanced_array_trees, array_trees, strict=True))
+    for root, array_tree, expected_tree in zip(
+        roots, array_trees, expected, strict=True
+    ):
+        np.testing.assert_array_equal(
+            ArrayTree.from_node(root).allocation, expected_tree.allocation
+        )
+        np.testing.assert_array_equal(array_tree.allocation, expected_tree.allocation)
+
+
+def test_balance_many_raises_errors_from_workers() -> None:
+    roots = [Node(children=[LeafNode(limit=1), LeafNode(limit=float("inf"))])]
+    with pytest.raises(AncestorChainWithoutLimitError):
+        list(balance_many(roots, max_workers=1))
@@ -1,10 +1,14 @@
+import random
+
 import pytest
+from random_trees import make_random_tree
 
 from constrained_node_allocation_balancer import (
     AncestorChainWithoutLimitError,
     Logs,
     constrained_node_allocation_balancer,
 )
+from logs import FieldChange
 from node import LeafNode, Node
 
 
@@ -321,3 +325,92 @@ class TestOnFourLevelTree:
             "1.1.2.1": 8,
             "1.2.1": 80,  # Would be `70` without `_adjust_inactive_limits`.
         }
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_water_filling_solver_matches_iterative_solver(seed: int) -> None:
+    # Given:
+    iterative_root = make_random_tree(random.Random(seed))
+    water_filling_root = make_random_tree(random.Random(seed))
+    # When:
+    constrained_node_allocation_balancer(iterative_root)
+    constrained_node_allocation_balancer(water_filling_root, solver="water_filling")
+    # Then:
+    assert water_filling_root.all_leaf_allocations == pytest.approx(
+        iterative_root.all_leaf_allocations
+    )
+
+
+def test_warm_start_keeps_root_allocation_if_still_largest_possible() -> None:
+    # Given:
+    root = Node(
+        limit=15, children=[LeafNode(limit=6), LeafNode(limit=1), LeafNode(limit=9)]
+    )
+    constrained_node_allocation_balancer(root)
+    root.children[2].limit = 8.5
+    # When:
+    logs: Logs = constrained_node_allocation_balancer(
+        root, return_logs=True, warm_start=True
+    )
+    # Then:
+    assert logs.events[0].message.startswith("Kept the root allocation 15")
+    assert root.all_leaf_allocations == {"1.1": 6, "1.2": 1, "1.3": 8}
+
+
+@pytest.mark.parametrize("solver", ["iterative", "water_filling"])
+@pytest.mark.parametrize("seed", range(20))
+def test_warm_start_matches_cold_start(seed: int, solver: str) -> None:
+    # Given:
+    warm_root = make_random_tree(random.Random(seed))
+    cold_root = make_random_tree(random.Random(seed))
+    constrained_node_allocation_balancer(warm_root, solver=solver)
+    rng = random.Random(seed)
+    for warm_leaf, cold_leaf in zip(
+        warm_root.all_leaves, cold_root.all_leaves, strict=True
+    ):
+        # Only lower limits, since `_adjust_inactive_limits` overwrites inactive limits:
+        if rng.random() < 0.3:
+            warm_leaf.limit = cold_leaf.limit = min(
+                cold_leaf.limit, rng.randint(0, 10) + 0.5
+            )
+    # When:
+    constrained_node_allocation_balancer(warm_root, solver=solver, warm_start=True)
+    constrained_node_allocation_balancer(cold_root, solver=solver)
+    # Then:
+    assert warm_root.all_leaf_allocations == pytest.approx(
+        cold_root.all_leaf_allocations
+    )
+
+
+def test_logs_record_every_step_and_reconstruct_trees() -> None:
+    # Given:
+    root = Node(
+        children=[
+            Node(limit=2, children=[LeafNode(limit=1), LeafNode(limit=2)]),
+            Node(limit=2, children=[LeafNode(limit=1), LeafNode(limit=2)]),
+        ]
+    )
+    # When:
+    logs: Logs = constrained_node_allocation_balancer(root, return_logs=True)
+    # Then:
+    messages = [event.message for event in logs.events]
+    assert messages == [
+        "Set the root allocation to the largest possible 4.0",
+        "Distributed 4.0 from node 1 to children ['1.1', '1.2']",
+        "Distributed 2.0 from node 1.1 to children ['1.1.1', '1.1.2']",
+        "Distributed 2.0 from node 1.2 to children ['1.2.1', '1.2.2']",
+    ]
+    assert logs.events[0].changes == (FieldChange("1", "allocation", 0.0, 4.0),)
+    assert logs.tree_at(0).all_leaf_allocations == {
+        "1.1.1": 0,
+        "1.1.2": 0,
+        "1.2.1": 0,
+        "1.2.2": 0,
+    }
+    assert logs.tree_at(2).all_leaf_allocations == {
+        "1.1.1": 1,
+        "1.1.2": 1,
+        "1.2.1": 0,
+        "1.2.2": 0,
+    }
+    assert logs.tree_at(3).all_leaf_allocations == root.all_leaf_allocations
@@ -0,0 +1,77 @@
+import copy
+import random
+
+import pytest
+from random_trees import make_random_tree
+
+from constrained_node_allocation_balancer import (
+    AncestorChainWithoutLimitError,
+    constrained_node_allocation_balancer,
+)
+from incremental_balancer import IncrementalBalancer
+from node import LeafNode, Node
+
+
+def assert_balanced(root: Node) -> None:
+    """Assert that the tree's allocations match those of a full solve of a copy of the tree."""
+    expected = copy.deepcopy(root)
+    for node in expected.all_nodes:
+        node.allocation = 0.0
+    constrained_node_allocation_balancer(expected, solver="water_filling")
+    assert root.all_leaf_allocations == pytest.approx(expected.all_leaf_allocations)
+
+
+def test_updating_a_limit() -> None:
+    # Given:
+    root = Node(
+        limit=10,
+        children=[
+            Node(children=[LeafNode(limit=2), LeafNode(limit=2)]),
+            Node(children=[LeafNode(limit=4), LeafNode(limit=4)]),
+        ],
+    )
+    balancer = IncrementalBalancer(root)
+    assert root.all_leaf_allocations == {"1.1.1": 2, "1.1.2": 2, "1.2.1": 3, "1.2.2": 3}
+    # When:
+    moved_leaf_ids = balancer.update_limit("1.2.2", 1)
+    # Then:
+    assert root.all_leaf_allocations == {"1.1.1": 2, "1.1.2": 2, "1.2.1": 4, "1.2.2": 1}
+    assert moved_leaf_ids == {"1.2.1", "1.2.2"}
+    # When:
+    moved_leaf_ids = balancer.update_limit("1.2", 4)
+    # Then:
+    assert root.all_leaf_allocations == {"1.1.1": 2, "1.1.2": 2, "1.2.1": 3, "1.2.2": 1}
+    assert moved_leaf_ids == {"1.2.1"}
+    assert balancer.update_limit("1.2.1", 5) == set()
+
+
+def test_rejecting_a_limit_leaving_a_leaf_unconstrained() -> None:
+    root = Node(children=[LeafNode(limit=1), LeafNode(limit=2)])
+    balancer = IncrementalBalancer(root)
+    with pytest.raises(AncestorChainWithoutLimitError):
+        balancer.update_limit("1.2", float("inf"))
+    assert root.children[1].limit == 2
+    assert balancer.update_limit("1.2", 3) == {"1.2"}
+    assert root.all_leaf_allocations == {"1.1": 1, "1.2": 3}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_changes(seed: int) -> None:
+    rng = random.Random(seed)
+    root = make_random_tree(rng, with_leaf_parameters=True)
+    balancer = IncrementalBalancer(root)
+    assert_balanced(root)
+    for _ in range(10):
+        node = rng.choice(root.all_nodes)
+        try:
+            balancer.update_limit(
+                node.id, rng.choice([float("inf"), rng.randint(1, 30)])
+            )
+        except AncestorChainWithoutLimitError:
+            pass
+        assert_balanced(root)
+    balancer.add_child(root.id, make_random_tree(rng, depth=1))
+    assert_balanced(root)
+    if len(root.children) > 1:
+        balancer.remove_child(root.children[0].id)
+        assert_balanced(root)
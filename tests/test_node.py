@@ -0,0 +1,74 @@
+import copy
+import sys
+
+from node import LeafNode, Node
+
+
+def make_tree() -> Node:
+    return Node(
+        children=[
+            LeafNode(limit=1, conversion_factor=2.0),
+            Node(
+                children=[
+                    LeafNode(limit=2, shift_constant=0.5),
+                    LeafNode(limit=3),
+                ],
+            ),
+        ],
+    )
+
+
+def test_structural_properties() -> None:
+    root = make_tree()
+    assert [n.id for n in root.all_nodes] == ["1", "1.1", "1.2", "1.2.1", "1.2.2"]
+    assert [n.id for n in root.children[1].all_descendants] == ["1.2.1", "1.2.2"]
+    assert [n.id for n in root.all_leaves] == ["1.1", "1.2.1", "1.2.2"]
+    assert {k: [n.id for n in v] for k, v in root.nodes_by_level.items()} == {
+        0: ["1"],
+        1: ["1.1", "1.2"],
+        2: ["1.2.1", "1.2.2"],
+    }
+    assert [n.id for n in root.children[1].children[0].ancestor_chain] == ["1.2", "1"]
+    assert root.n_leaves_at_or_below == 4.0
+    assert root.children[1].n_leaves_at_or_below == 2.0
+    assert root.sum_of_shift_constants_at_or_below == 0.5
+
+
+def test_index_is_rebuilt_after_adding_and_removing_children() -> None:
+    root = make_tree()
+    index = root.index
+    assert root.n_leaves_at_or_below == 4.0
+
+    root.children[1].add_child(LeafNode(limit=4))
+    assert not index.valid
+    assert root.n_leaves_at_or_below == 5.0
+    assert [n.id for n in root.all_leaves] == ["1.1", "1.2.1", "1.2.2", "1.2.3"]
+
+    removed = root.children[0]
+    root.remove_child(removed)
+    assert root.n_leaves_at_or_below == 3.0
+    assert [n.id for n in root.all_leaves] == ["1.1.1", "1.1.2", "1.1.3"]
+    assert removed.id == "1"
+    assert removed.all_nodes == [removed]
+
+
+def test_deep_trees_do_not_hit_the_recursion_limit() -> None:
+    depth = 2 * sys.getrecursionlimit()
+    root = LeafNode(limit=1)
+    for _ in range(depth):
+        root = Node(children=[root])
+    leaf = root.all_leaves[0]
+    assert leaf.level == depth
+    assert leaf.id == ".".join(["1"] * (depth + 1))
+    assert len(leaf.ancestor_chain) == depth
+    assert len(root.tree_repr().splitlines()) == depth + 1
+    root_copy = copy.deepcopy(root)
+    assert root_copy.all_leaves[0].id == leaf.id
+    assert root_copy.all_leaves[0] is not leaf
+
+
+def test_nodes_are_slotted_and_have_integer_positions() -> None:
+    root = make_tree()
+    assert not any(hasattr(n, "__dict__") for n in root.all_nodes)
+    assert [n.position for n in root.all_nodes] == [0, 1, 2, 3, 4]
+    assert root.children[1].children[0].position == 3
@@ -0,0 +1,67 @@
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+from random_trees import make_random_tree
+
+from constrained_node_allocation_balancer import constrained_node_allocation_balancer
+from node import LeafNode
+from tree_table import TreeTable
+
+
+def test_building_a_tree_from_columns() -> None:
+    # Given:
+    table = TreeTable(
+        node_id=["b", "feeder", "a", "c"],
+        parent_id=["feeder", None, "feeder", "b"],
+        limit=[5.0, 10.0, 3.0, float("inf")],
+        conversion_factor=[1.0, 1.0, 2.0, 1.0],
+    )
+    # When:
+    tree = table.to_tree()
+    # Then:
+    assert tree.limit == 10.0
+    assert [c.limit for c in tree.children] == [5.0, 3.0]
+    assert isinstance(tree.children[1], LeafNode)
+    assert tree.children[1].conversion_factor == 2.0
+    assert [n.id for n in tree.all_leaves] == ["1.1.1", "1.2"]
+
+
+def test_building_a_tree_from_parent_indices() -> None:
+    table = TreeTable.from_parent_indices(
+        parent=np.array([-1, 0, 0, 1]), limit=np.array([4.0, 3.0, 2.0, 1.0])
+    )
+    tree = table.to_tree()
+    assert [n.limit for n in tree.all_nodes] == [4.0, 3.0, 1.0, 2.0]
+
+
+@pytest.mark.parametrize(
+    ("node_id", "parent_id", "message"),
+    [
+        (["a", "b", "b"], [None, "a", "a"], "Duplicate"),
+        (["a", "b"], [None, "x"], "unknown parents"),
+        (["a", "b"], ["b", "a"], "exactly one root"),
+        (["a", "b", "c", "d"], [None, "c", "b", "c"], "cycle"),
+    ],
+)
+def test_raising_for_invalid_tables(
+    node_id: list[str], parent_id: list[str | None], message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        TreeTable(node_id=node_id, parent_id=parent_id).to_tree()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_round_trip_through_csv(seed: int, tmp_path: Path) -> None:
+    # Given:
+    root = make_random_tree(random.Random(seed), with_leaf_parameters=True)
+    TreeTable.from_tree(root).write_csv(tmp_path / "tree.csv")
+    # When:
+    table = TreeTable.read_csv(tmp_path / "tree.csv")
+    tree = table.to_tree()
+    constrained_node_allocation_balancer(tree)
+    table.update_from_tree(tree)
+    # Then:
+    constrained_node_allocation_balancer(root)
+    assert table == TreeTable.from_tree(root)
@@ -0,0 +1,42 @@
+import math
+
+import pytest
+
+from water_filling import water_fill, water_fill_with_capped
+
+
+def test_water_fill_without_limits_reached() -> None:
+    assert water_fill(6, [10, 10, 10], [1, 1, 1], [0, 0, 0]) == [2, 2, 2]
+    assert water_fill(6, [math.inf, 10], [2, 1], [0, 0]) == [4, 2]
+
+
+def test_water_fill_caps_recipients_in_order_of_their_limits() -> None:
+    # As in `test_allocating_to_leaves_when_redistribution_is_necessary`:
+    assert water_fill(15, [6, 1, 9], [1, 1, 1], [0, 0, 0]) == [6, 1, 8]
+
+
+def test_water_fill_with_offsets() -> None:
+    assert water_fill(10, [math.inf, math.inf], [1, 1], [1, 3]) == [4, 6]
+    assert water_fill(10, [math.inf, 5], [1, 1], [1, 3]) == [5, 5]
+
+
+def test_water_fill_with_insufficient_limits() -> None:
+    assert water_fill(10, [1, 2], [1, 1], [0, 0]) == pytest.approx([1, 2])
+
+
+def test_water_fill_with_capped() -> None:
+    limits, weights, offsets = [6, 1, 9], [1, 1, 1], [0, 0, 0]
+    assert water_fill_with_capped(
+        15, limits, weights, offsets, [True, True, False]
+    ) == [
+        6,
+        1,
+        8,
+    ]
+    assert (
+        water_fill_with_capped(15, limits, weights, offsets, [False, True, False])
+        is None
+    )
+    assert (
+        water_fill_with_capped(15, limits, weights, offsets, [True, True, True]) is None
+    )